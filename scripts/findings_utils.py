@@ -0,0 +1,68 @@
+"""Finding aggregates shared by the risk evaluator and the report generator."""
+
+import sys
+from collections import Counter, defaultdict
+from itertools import islice
+
+SEVERITY_MAP = {
+    "CRITICAL": 5,
+    "HIGH": 4,
+    "MEDIUM": 3,
+    "LOW": 2,
+    "INFO": 1
+}
+CRITICAL_HIGH = frozenset(("CRITICAL", "HIGH"))
+# Common spellings map straight to the canonical label so hot loops skip str.upper().
+_SEV_NORM = {variant: sev for sev in SEVERITY_MAP for variant in (sev, sev.lower(), sev.title())}
+
+
+def normalize_severity(value: str) -> str:
+    return _SEV_NORM.get(value) or sys.intern(value.upper())
+
+
+def critical_high_preview(findings: list, limit: int = 5) -> tuple[list, int]:
+    """Return the first ``limit`` critical/high findings and how many there are in total."""
+    critical_high = (f for f in findings if f["severity"] in CRITICAL_HIGH)
+    shown = list(islice(critical_high, limit))
+    # Drain the same generator so the remainder is counted without rescanning.
+    return shown, len(shown) + sum(1 for _ in critical_high)
+
+
+def attack_surface_clusters(findings: list, limit: int = 5) -> list:
+    """Group findings by location and severity, heaviest clusters first."""
+    _sw = SEVERITY_MAP.get
+    triples = Counter(
+        (
+            finding.get("location", "Unknown"),
+            finding.get("severity", "INFO"),
+            finding.get("source", finding.get("scanner", "Unknown"))
+        )
+        for finding in findings
+    )
+
+    # Severity is normalized per distinct triple rather than per finding.
+    clusters = defaultdict(lambda: [0, set()])
+    for (location, raw_severity, source), count in triples.items():
+        entry = clusters[(location, normalize_severity(raw_severity))]
+        entry[0] += count
+        entry[1].add(source)
+
+    sorted_clusters = sorted(
+        clusters.items(),
+        key=lambda item: (_sw(item[0][1], 0) * item[1][0], item[1][0]),
+        reverse=True
+    )
+    return [
+        {"location": location, "severity": severity, "count": count, "scanners": sorted(sources)}
+        for (location, severity), (count, sources) in sorted_clusters[:limit]
+    ]
+
+
+def build_precomputed(findings: list) -> dict:
+    """Aggregates the report generator renders, so it never has to walk every finding."""
+    top_critical_high, critical_high_total = critical_high_preview(findings)
+    return {
+        "top_critical_high": top_critical_high,
+        "critical_high_total": critical_high_total,
+        "attack_surface": attack_surface_clusters(findings)
+    }
@@ -0,0 +1,24 @@
+"""JSON helpers shared by the reporting scripts; orjson is used when installed."""
+
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+if orjson is not None:
+    loads = orjson.loads
+    dumpb = orjson.dumps
+
+    def dumps(obj) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+else:
+    loads = json.loads
+
+    def dumpb(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode()
+
+    def dumps(obj) -> str:
+        return json.dumps(obj, indent=2)
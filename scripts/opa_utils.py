@@ -1,13 +1,35 @@
-"""OPA helper utilities shared by evaluation scripts."""
+"""OPA helper utilities shared by evaluation scripts.
 
-import json
+Networking and process modules are imported inside the functions that need
+them so scripts that hit the evaluation cache or exit early skip their
+import cost.
+"""
+
+import hashlib
 import os
-import platform
-import shutil
-import subprocess
 import sys
-import urllib.request
+import time
+from contextlib import contextmanager
+from itertools import pairwise
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+from json_utils import dumpb, loads
+
+if TYPE_CHECKING:
+    import subprocess
+
+EVALUATION_QUERY = "data.dast.evaluation"
+# State of the shared ``opa run --server`` daemon, relative to the working directory.
+DAEMON_DIR = Path("reports/.opa-daemon")
+
+_HAVE_PROC = Path("/proc/self/cmdline").exists()
+
+# Fail fast on a stalled upstream or daemon; both callers have a fallback.
+HEAD_TIMEOUT = 5.0
+SERVER_TIMEOUT = 30.0
+
+_POOL = None
 
 
 def ensure_opa_binary(cache_dir: Path, version: str) -> Path:
@@ -17,10 +39,14 @@ def ensure_opa_binary(cache_dir: Path, version: str) -> Path:
         if override_path.exists():
             return override_path
 
+    import shutil
+
     which_opa = shutil.which("opa")
     if which_opa:
         return Path(which_opa)
 
+    import platform
+
     cache_dir.mkdir(parents=True, exist_ok=True)
     system = platform.system().lower()
     arch_map = {
@@ -32,55 +58,407 @@ def ensure_opa_binary(cache_dir: Path, version: str) -> Path:
     arch = arch_map.get(platform.machine().lower(), platform.machine().lower())
 
     binary_path = cache_dir / "opa"
-    if binary_path.exists():
-        binary_path.chmod(0o755)
-        return binary_path
+    etag_path = cache_dir / "opa.etag"
+    sha_path = cache_dir / "opa.sha256"
 
     if version == "latest":
         url = f"https://openpolicyagent.org/downloads/latest/opa_{system}_{arch}"
     else:
         url = f"https://openpolicyagent.org/downloads/v{version}/opa_{system}_{arch}"
 
+    cached_hash = _read_sidecar(sha_path)
+    if binary_path.exists() and cached_hash and cached_hash == _file_sha256(binary_path):
+        try:
+            with _open_url(url, method="HEAD", timeout=HEAD_TIMEOUT) as resp:
+                validator = _cache_validator(resp.headers)
+        except OSError as exc:  # pragma: no cover - network issues
+            print("Could not check upstream OPA binary, using cached copy:", exc, file=sys.stderr)
+            validator = None
+        if validator is None or validator == _read_sidecar(etag_path):
+            binary_path.chmod(0o755)
+            return binary_path
+
     print(f"Downloading OPA from {url}")
+    tmp_path = cache_dir / "opa.tmp"
+    digest = hashlib.sha256()
     try:
-        with urllib.request.urlopen(url) as resp, binary_path.open("wb") as out:
-            out.write(resp.read())
-    except Exception as exc:  # pragma: no cover - network issues
+        with _open_url(url) as resp, tmp_path.open("wb") as out:
+            validator = _cache_validator(resp.headers)
+            shutil.copyfileobj(resp, _HashingWriter(out, digest), length=1 << 20)
+        verified = _verify_checksum(url, digest.hexdigest())
+    except BaseException as exc:  # pragma: no cover - network issues
+        tmp_path.unlink(missing_ok=True)
         print("Failed to download OPA binary:", exc, file=sys.stderr)
         raise
 
-    binary_path.chmod(0o755)
+    tmp_path.chmod(0o755)
+    os.replace(tmp_path, binary_path)
+    if not verified:
+        # Leave no sidecars so the next run downloads again and retries verification.
+        sha_path.unlink(missing_ok=True)
+        etag_path.unlink(missing_ok=True)
+        return binary_path
+    sha_path.write_text(digest.hexdigest())
+    if validator:
+        etag_path.write_text(validator)
+    else:
+        etag_path.unlink(missing_ok=True)
     return binary_path
 
 
-def run_opa(opa_path: Path, input_path: Path, policy_dir: Path) -> dict:
+def _http_pool():
+    """Return the process-wide urllib3 pool, or None when urllib3 is not installed."""
+    global _POOL
+    if _POOL is None:
+        try:
+            import urllib3
+            from urllib3.util.retry import Retry
+        except ImportError:  # pragma: no cover - optional dependency
+            _POOL = False
+        else:
+            _POOL = urllib3.PoolManager(maxsize=4, retries=Retry(total=3, backoff_factor=0.3))
+    return _POOL or None
+
+
+@contextmanager
+def _open_url(
+    url: str,
+    method: str = "GET",
+    body: bytes | None = None,
+    headers: dict | None = None,
+    timeout: float | None = None
+):
+    options = {} if timeout is None else {"timeout": timeout}
+    pool = _http_pool()
+    if pool is None:
+        import urllib.request
+
+        request = urllib.request.Request(url, data=body, headers=headers or {}, method=method)
+        with urllib.request.urlopen(request, **options) as resp:
+            yield resp
+        return
+
+    from urllib3.exceptions import HTTPError
+
+    if timeout is not None:
+        # Callers that set a timeout have a fallback, so do not multiply it with retries.
+        options["retries"] = False
+    # Surface urllib3 failures as OSError, like urllib.request does, so callers catch one type.
+    try:
+        resp = pool.request(method, url, body=body, headers=headers, preload_content=False, **options)
+    except HTTPError as exc:
+        raise OSError(f"Request to {url} failed: {exc}") from exc
+    try:
+        if resp.status >= 400:
+            raise OSError(f"HTTP {resp.status} returned by {url}")
+        yield resp
+    except HTTPError as exc:
+        resp.close()
+        raise OSError(f"Request to {url} failed: {exc}") from exc
+    except BaseException:
+        resp.close()
+        raise
+    finally:
+        resp.release_conn()
+
+
+class _HashingWriter:
+    """File wrapper that feeds every written chunk into a digest."""
+
+    def __init__(self, fh, digest):
+        self.fh = fh
+        self.digest = digest
+
+    def write(self, data) -> int:
+        self.digest.update(data)
+        return self.fh.write(data)
+
+
+def _read_sidecar(path: Path) -> str | None:
+    try:
+        return path.read_text().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_validator(headers) -> str | None:
+    return headers.get("ETag") or headers.get("Last-Modified")
+
+
+def _verify_checksum(url: str, actual: str) -> bool:
+    """Compare a download against the ``.sha256`` file OPA publishes next to each binary.
+
+    Returns False when the published checksum cannot be fetched and raises on a mismatch.
+    """
+    try:
+        with _open_url(f"{url}.sha256") as resp:
+            published = resp.read().decode().split()
+    except OSError as exc:  # pragma: no cover - network issues
+        print("Published OPA checksum unavailable, not caching this download:", exc, file=sys.stderr)
+        return False
+    if not published or published[0].lower() != actual:
+        raise RuntimeError(f"OPA checksum mismatch for {url}")
+    return True
+
+
+class OpaServer:
+    """Client for an ``opa run --server`` process that keeps the policy compiled."""
+
+    def __init__(self, process: "subprocess.Popen | None", url: str):
+        self.process = process
+        self.url = url
+
+    def evaluate(self, input_bytes: bytes) -> dict:
+        body = b'{"input":' + input_bytes + b"}"
+        headers = {"Content-Type": "application/json"}
+        with _open_url(
+            f"{self.url}/v1/data/dast/evaluation",
+            method="POST",
+            body=body,
+            headers=headers,
+            timeout=SERVER_TIMEOUT
+        ) as resp:
+            parsed = loads(resp.read())
+        if "result" not in parsed:
+            raise RuntimeError("OPA server did not return an evaluation result")
+        return parsed["result"]
+
+
+def run_opa_server_start(opa_path: Path, policy_dir: Path, timeout: float = 10.0) -> OpaServer | None:
+    """Start a detached ``opa run --server`` that outlives this process."""
+    import socket
+    import subprocess
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    cmd = [
+        str(opa_path),
+        "run",
+        "--server",
+        "--addr",
+        f"127.0.0.1:{port}",
+        "--set=decision_logs.console=false",
+        # Long-lived daemons pick up policy edits instead of serving a stale bundle.
+        "--watch",
+        str(policy_dir)
+    ]
+    try:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+    except OSError as exc:
+        print("Failed to start OPA server:", exc, file=sys.stderr)
+        return None
+
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and process.poll() is None:
+        if _server_healthy(url):
+            return OpaServer(process, url)
+        time.sleep(0.1)
+
+    print("OPA server did not become healthy, falling back to opa eval", file=sys.stderr)
+    process.kill()
+    process.wait()
+    return None
+
+
+def get_or_start_daemon(opa_path: Path, policy_dir: Path, state_dir: Path) -> OpaServer | None:
+    """Reuse the OPA server recorded in ``state_dir`` or start a detached one for later scripts."""
+    pid_path = state_dir / "pid"
+    url_path = state_dir / "url"
+    policy_path = state_dir / "policy"
+    policy = str(policy_dir.resolve())
+    if not _HAVE_PROC:
+        import shutil
+
+        if shutil.which("ps") is None:
+            # Without a way to identify our daemon, every run would leak a new one.
+            print("Cannot inspect processes (no /proc or ps), evaluating with opa eval instead", file=sys.stderr)
+            return None
+
+    pid = _read_sidecar(pid_path)
+    url = _read_sidecar(url_path)
+    if (
+        pid
+        and url
+        and _is_recorded_daemon(pid, url)
+        and _read_sidecar(policy_path) == policy
+        and _server_healthy(url)
+    ):
+        print(f"Reusing OPA daemon at {url}")
+        return OpaServer(None, url)
+    stop_daemon(state_dir)
+
+    server = run_opa_server_start(opa_path, policy_dir)
+    if server is None:
+        return None
+    state_dir.mkdir(parents=True, exist_ok=True)
+    pid_path.write_text(str(server.process.pid))
+    url_path.write_text(server.url)
+    policy_path.write_text(policy)
+    print(f"Started OPA daemon at {server.url} (pid {server.process.pid})")
+    return server
+
+
+def stop_daemon(state_dir: Path) -> None:
+    pid = _read_sidecar(state_dir / "pid")
+    url = _read_sidecar(state_dir / "url")
+    if pid and url and _is_recorded_daemon(pid, url):
+        import signal
+
+        try:
+            os.kill(int(pid), signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for name in ("pid", "url", "policy"):
+        (state_dir / name).unlink(missing_ok=True)
+
+
+def _is_recorded_daemon(pid: str, url: str) -> bool:
+    """Check that ``pid`` is still the ``opa run --server`` we started, not a process that reused the PID."""
+    try:
+        args = _process_args(int(pid))
+    except ValueError:
+        return False
+    addr = url.removeprefix("http://")
+    pairs = list(pairwise(args))
+    return ("run", "--server") in pairs and ("--addr", addr) in pairs
+
+
+def _process_args(pid: int) -> list[str]:
+    """Command line of ``pid`` from /proc, or from ``ps`` where /proc is missing (macOS)."""
+    if _HAVE_PROC:
+        try:
+            cmdline = Path(f"/proc/{pid}/cmdline").read_bytes()
+        except OSError:
+            return []
+        return [arg.decode(errors="replace") for arg in cmdline.split(b"\0") if arg]
+
+    import subprocess
+
+    try:
+        result = subprocess.run(["ps", "-p", str(pid), "-o", "command="], capture_output=True, text=True, check=False)
+    except OSError:
+        return []
+    return result.stdout.split()
+
+
+def _server_healthy(url: str) -> bool:
+    import urllib.request
+
+    try:
+        with urllib.request.urlopen(f"{url}/health", timeout=1) as resp:
+            return resp.status == 200
+    except OSError:
+        return False
+
+
+def run_opa(
+    opa_path: Path,
+    input_obj: dict,
+    policy_dir: Path,
+    cache_dir: Path | None = None,
+    daemon_dir: Path | None = None
+) -> dict:
+    input_bytes = dumpb(input_obj)
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = cache_dir / f"{_evaluation_cache_key(opa_path, policy_dir, input_bytes)}.json"
+        cached = _read_cached_evaluation(cache_path)
+        if cached is not None:
+            print(f"Using cached OPA evaluation: {cache_path}")
+            return cached
+
+    evaluation = None
+    server = get_or_start_daemon(opa_path, policy_dir, daemon_dir) if daemon_dir is not None else None
+    if server is not None:
+        try:
+            evaluation = server.evaluate(input_bytes)
+        except (OSError, ValueError, RuntimeError) as exc:
+            print("OPA server evaluation failed, falling back to opa eval:", exc, file=sys.stderr)
+    if evaluation is None:
+        evaluation = _run_opa_eval(opa_path, input_bytes, policy_dir)
+
+    if cache_path is not None:
+        _write_cached_evaluation(cache_path, evaluation)
+    return evaluation
+
+
+def _evaluation_cache_key(opa_path: Path, policy_dir: Path, input_bytes: bytes) -> str:
+    """Hash the OPA binary, the query, every file OPA loads from ``policy_dir`` and the input document."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"opa:{_file_sha256(opa_path)}:query:{EVALUATION_QUERY}:".encode())
+    for path in sorted(p for p in policy_dir.rglob("*") if p.is_file()):
+        content = path.read_bytes()
+        digest.update(f"{path.relative_to(policy_dir).as_posix()}:{len(content)}:".encode())
+        digest.update(content)
+    digest.update(b"input:")
+    digest.update(input_bytes)
+    return digest.hexdigest()
+
+
+def _read_cached_evaluation(path: Path) -> dict | None:
+    try:
+        return loads(path.read_bytes())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_cached_evaluation(path: Path, evaluation: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(dumpb(evaluation))
+    os.replace(tmp_path, path)
+
+
+def _run_opa_eval(opa_path: Path, input_bytes: bytes, policy_dir: Path) -> dict:
+    import subprocess
+
     cmd = [
         str(opa_path),
         "eval",
         "--format",
         "json",
-        "--input",
-        str(input_path),
+        "--stdin-input",
         "--data",
         str(policy_dir),
-        "data.dast.evaluation"
+        EVALUATION_QUERY
     ]
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = subprocess.run(
+            cmd,
+            input=input_bytes,
+            capture_output=True,
+            check=True
+        )
     except subprocess.CalledProcessError as exc:
         print("OPA evaluation failed")
         print("Command:", exc.cmd)
         print("Return code:", exc.returncode)
         if exc.stdout:
-            print("OPA stdout:", exc.stdout)
+            print("OPA stdout:", exc.stdout.decode(errors="replace"))
         if exc.stderr:
-            print("OPA stderr:", exc.stderr, file=sys.stderr)
+            print("OPA stderr:", exc.stderr.decode(errors="replace"), file=sys.stderr)
         raise
     payload = result.stdout
     if not payload:
         raise RuntimeError("OPA did not return output")
 
-    parsed = json.loads(payload)
+    parsed = loads(payload)
     expressions = parsed.get("result", [])
     if not expressions:
         raise RuntimeError("OPA did not return an evaluation result")
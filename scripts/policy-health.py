@@ -4,7 +4,8 @@
 import argparse
 from pathlib import Path
 
-from opa_utils import ensure_opa_binary, run_opa
+from json_utils import loads
+from opa_utils import DAEMON_DIR, ensure_opa_binary, run_opa
 
 
 def main():
@@ -14,6 +15,8 @@ def main():
     parser.add_argument("--expected-status", default="PASS", help="Expected status for the canonical dataset")
     parser.add_argument("--max-risk", type=int, default=5, help="Maximum acceptable risk score")
     parser.add_argument("--opa-version", default="latest", help="OPA release version")
+    parser.add_argument("--cache", action="store_true", help="Reuse a cached evaluation for unchanged policies, input and OPA binary")
+    parser.add_argument("--opa-daemon", action="store_true", help="Evaluate through a shared `opa run --server` daemon tracked in reports/.opa-daemon")
     args = parser.parse_args()
 
     policy_dir = Path(args.policy_dir)
@@ -27,7 +30,15 @@ def main():
     cache_dir = Path("reports/.opa-health-cache")
     cache_dir.mkdir(parents=True, exist_ok=True)
     opa_binary = ensure_opa_binary(cache_dir, args.opa_version)
-    evaluation = run_opa(opa_binary, input_path, policy_dir)
+    evaluation_cache = cache_dir / "evaluations" if args.cache else None
+    daemon_dir = DAEMON_DIR if args.opa_daemon else None
+    evaluation = run_opa(
+        opa_binary,
+        loads(input_path.read_bytes()),
+        policy_dir,
+        cache_dir=evaluation_cache,
+        daemon_dir=daemon_dir
+    )
 
     status = evaluation.get("status")
     risk = evaluation.get("risk_score", 0)
@@ -2,13 +2,14 @@
 """Compare risk scores to detect regressions between runs."""
 
 import argparse
-import json
 import sys
 
+from json_utils import loads
+
 
 def load_eval(path):
-    with open(path) as fh:
-        return json.load(fh)
+    with open(path, "rb") as fh:
+        return loads(fh.read())
 
 
 def main():
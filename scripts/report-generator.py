@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 import argparse
-import json
-from datetime import datetime
+import string
+import time
+
+from findings_utils import build_precomputed
+from json_utils import loads
 
 TEMPLATE = """
 ## DAST Security Scan Report
@@ -62,13 +65,9 @@ TEMPLATE = """
 {artifact_summary}
 """
 
-SEVERITY_MAP = {
-    'CRITICAL': 5,
-    'HIGH': 4,
-    'MEDIUM': 3,
-    'LOW': 2,
-    'INFO': 1
-}
+
+# (literal, field, spec, conversion) chunks, parsed once instead of on every format call.
+_TEMPLATE_PARTS = list(string.Formatter().parse(TEMPLATE))
 
 
 def generate_status_badge(status: str) -> str:
@@ -114,17 +113,12 @@ def generate_status_message(data: dict, storage_url: str | None, artifacts_url:
 
     return " ".join(fragments)
 
-def generate_critical_high_details(findings: list) -> str:
-    critical_high = [
-        f for f in findings 
-        if f['severity'] in ['CRITICAL', 'HIGH']
-    ]
-    
-    if not critical_high:
+def generate_critical_high_details(shown: list, total: int) -> str:
+    if not shown:
         return "_No critical or high severity findings._"
-    
+
     details = []
-    for i, finding in enumerate(critical_high[:5], 1):
+    for i, finding in enumerate(shown, 1):
         details.append(f"""
 **{i}. [{finding['severity']}] {finding['name']}**
 - **Source:** {finding['source']}
@@ -132,8 +126,8 @@ def generate_critical_high_details(findings: list) -> str:
 - **Solution:** {finding['solution'][:150]}...
 """)
     
-    if len(critical_high) > 5:
-        details.append(f"\n_... and {len(critical_high) - 5} more. See full report in artifacts._")
+    if total > len(shown):
+        details.append(f"\n_... and {total - len(shown)} more. See full report in artifacts._")
     
     return '\n'.join(details)
 
@@ -188,32 +182,12 @@ def generate_artifact_summary(artifacts_url: str | None, storage_url: str | None
     return "- Full ZAP/Nuclei/evaluation artifacts are attached to the workflow run for deeper inspection."
 
 
-def severity_weight(severity: str) -> int:
-    return SEVERITY_MAP.get(severity.upper(), 0)
-
-
-def generate_attack_surface(findings: list, limit: int = 5) -> str:
-    clusters = {}
-    for finding in findings:
-        location = finding.get("location", "Unknown")
-        severity = finding.get("severity", "INFO").upper()
-        source = finding.get("source", finding.get("scanner", "Unknown"))
-        key = (location, severity)
-        entry = clusters.setdefault(key, {"count": 0, "scanners": set()})
-        entry["count"] += 1
-        entry["scanners"].add(source)
-
-    sorted_clusters = sorted(
-        clusters.items(),
-        key=lambda item: (severity_weight(item[0][1]) * item[1]["count"], item[1]["count"]),
-        reverse=True
-    )
-
+def generate_attack_surface(clusters: list) -> str:
     lines = []
-    for (location, severity), entry in sorted_clusters[:limit]:
-        scanners = ", ".join(sorted(entry["scanners"]))
+    for cluster in clusters:
+        scanners = ", ".join(cluster["scanners"])
         lines.append(
-            f"- `{location}` ({severity}) — {entry['count']} findings from {scanners}."
+            f"- `{cluster['location']}` ({cluster['severity']}) — {cluster['count']} findings from {scanners}."
         )
 
     if not lines:
@@ -226,8 +200,8 @@ def load_tuning_data(path: str | None) -> dict | None:
     if not path:
         return None
     try:
-        with open(path) as fh:
-            return json.load(fh)
+        with open(path, 'rb') as fh:
+            return loads(fh.read())
     except FileNotFoundError:
         return None
 
@@ -258,6 +232,16 @@ def generate_tuning_section(tuning_data: dict | None) -> str:
 
     return "\n".join(lines)
 
+
+def render_report(**fields) -> str:
+    parts = []
+    for literal, field, spec, _conversion in _TEMPLATE_PARTS:
+        parts.append(literal)
+        if field is not None:
+            parts.append(format(fields[field], spec))
+    return ''.join(parts)
+
+
 def main():
     parser = argparse.ArgumentParser(description='Generate DAST report summary')
     parser.add_argument('--input', required=True, help='Evaluation JSON input')
@@ -268,15 +252,17 @@ def main():
 
     args = parser.parse_args()
 
-    with open(args.input) as f:
-        data = json.load(f)
+    with open(args.input, 'rb') as f:
+        data = loads(f.read())
 
     counts = data['severity_counts']
+    # Older evaluation.json files predate the precomputed block.
+    precomputed = data.get('precomputed') or build_precomputed(data['findings'])
     tuning_data = load_tuning_data(args.tuning_json)
-    report = TEMPLATE.format(
+    report = render_report(
         app_name=data['app_name'],
         status_badge=generate_status_badge(data['status']),
-        scan_date=datetime.utcnow().strftime('%Y-%m-%d %H:%M UTC'),
+        scan_date=time.strftime('%Y-%m-%d %H:%M UTC', time.gmtime()),
         risk_score=data['risk_score'],
         critical=counts['CRITICAL'],
         high=counts['HIGH'],
@@ -285,8 +271,10 @@ def main():
         info=counts['INFO'],
         total=data['total_findings'],
         status_message=generate_status_message(data, args.storage_url, args.artifacts_url),
-        critical_high_details=generate_critical_high_details(data['findings']),
-        attack_surface=generate_attack_surface(data['findings']),
+        critical_high_details=generate_critical_high_details(
+            precomputed['top_critical_high'], precomputed['critical_high_total']
+        ),
+        attack_surface=generate_attack_surface(precomputed['attack_surface']),
         recommendations=generate_recommendations(data),
         tuning_section=generate_tuning_section(tuning_data),
         artifact_summary=generate_artifact_summary(args.artifacts_url, args.storage_url)
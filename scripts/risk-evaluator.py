@@ -4,87 +4,201 @@
 import argparse
 import json
 import os
-from datetime import datetime
+import sys
+from dataclasses import dataclass
+from datetime import UTC, datetime
 from pathlib import Path
 
-from opa_utils import ensure_opa_binary, run_opa
+from findings_utils import build_precomputed, normalize_severity
+from json_utils import dumps, loads
+from opa_utils import DAEMON_DIR, ensure_opa_binary, run_opa
+
+# Below this combined report size a worker process costs more than it saves.
+PARALLEL_PARSE_BYTES = 8 * 1024 * 1024
+# ZAP repeats the same alert text for every affected URL; share one copy per distinct string.
+_STR_POOL: dict[str, str] = {}
+
+
+def _intern(value):
+    return _STR_POOL.setdefault(value, value)
+
+
+class _Record:
+    __slots__ = ()
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True)
+class ZapFinding(_Record):
+    source: str
+    name: str
+    severity: str
+    description: str
+    solution: str
+    instances: int
+    location: str
+    rule_id: str | None
+    confidence: str | None
+    scanner: str
+
+
+@dataclass(slots=True)
+class NucleiFinding(_Record):
+    source: str
+    name: str
+    severity: str
+    description: str
+    solution: str
+    matched_at: str
+    location: str
+    template_id: str | None
+    scanner: str
+
+
+def _load_ijson():
+    """Import ijson on first use; it is optional and only needed once a report is parsed."""
+    try:
+        import ijson
+    except ImportError:  # pragma: no cover - optional dependency
+        return None
+    return ijson
+
+
+def iter_zap_alerts(fh):
+    """Yield ZAP alerts one at a time, streaming the report when ijson is available."""
+    ijson = _load_ijson()
+    if ijson is not None:
+        yield from ijson.items(fh, "site.item.alerts.item", use_float=True)
+        return
+
+    data = loads(fh.read())
+    for site in data.get("site", []):
+        yield from site.get("alerts", [])
 
 
 def parse_zap_report(report_path: Path):
     if not report_path.exists():
         return []
 
-    with report_path.open() as fh:
-        data = json.load(fh)
-
     findings = []
-    for site in data.get("site", []):
-        for alert in site.get("alerts", []):
-            severity = alert.get("riskdesc", "INFO").split()[0].upper()
+    with report_path.open("rb") as fh:
+        for alert in iter_zap_alerts(fh):
+            riskdesc = alert.get("riskdesc", "INFO")
+            space = riskdesc.find(" ")
+            severity = normalize_severity(riskdesc if space < 0 else riskdesc[:space])
             instances = alert.get("instances", [])
             first_instance = instances[0] if instances else {}
             location = first_instance.get("uri") or first_instance.get("requestHeader")
-            findings.append({
-                "source": "ZAP",
-                "name": alert.get("name", "Unknown"),
-                "severity": severity,
-                "description": alert.get("desc", ""),
-                "solution": alert.get("solution", ""),
-                "instances": len(instances),
-                "location": location or "Unknown",
-                "rule_id": alert.get("pluginId") or alert.get("pluginid"),
-                "confidence": alert.get("confidence"),
-                "scanner": "ZAP"
-            })
+            findings.append(ZapFinding(
+                source="ZAP",
+                name=_intern(alert.get("name", "Unknown")),
+                severity=severity,
+                description=_intern(alert.get("desc", "")),
+                solution=_intern(alert.get("solution", "")),
+                instances=len(instances),
+                location=location or "Unknown",
+                rule_id=alert.get("pluginId") or alert.get("pluginid"),
+                confidence=alert.get("confidence"),
+                scanner="ZAP"
+            ))
 
     return findings
 
 
-def parse_nuclei_report(report_path: Path):
-    if not report_path.exists():
-        return []
+def iter_nuclei_entries(fh):
+    """Yield Nuclei results from a JSON array export or JSON lines output, one at a time."""
+    first = fh.read(1)
+    while first.isspace():
+        first = fh.read(1)
+    if not first:
+        return
+    fh.seek(fh.tell() - 1)
 
-    findings = []
-    with report_path.open() as fh:
-        raw = fh.read().strip()
-        if not raw:
-            return findings
+    if first == b"[":
+        ijson = _load_ijson()
+        errors = (json.JSONDecodeError,) if ijson is None else (json.JSONDecodeError, ijson.JSONError)
+        try:
+            if ijson is not None:
+                yield from ijson.items(fh, "item", use_float=True)
+            else:
+                yield from loads(fh.read())
+        except errors as exc:
+            # A truncated export should not abort the evaluation; keep what was read so far.
+            print(f"Nuclei report is not valid JSON, ignoring the rest: {exc}", file=sys.stderr)
+        return
 
+    first_line = True
+    while line := fh.readline():
+        line = line.strip()
+        if not line:
+            continue
         try:
-            payload = json.loads(raw)
+            yield loads(line)
         except json.JSONDecodeError:
-            fh.seek(0)
-            entries = []
-            for line in fh:
-                line = line.strip()
-                if not line:
-                    continue
+            if first_line:
+                # A pretty-printed single object rather than JSON lines.
+                resume = fh.tell()
                 try:
-                    entries.append(json.loads(line))
+                    document = loads(line + b"\n" + fh.read())
                 except json.JSONDecodeError:
-                    continue
-        else:
-            entries = payload if isinstance(payload, list) else [payload]
+                    fh.seek(resume)
+                else:
+                    yield document
+                    return
+        first_line = False
 
-    for entry in entries:
-        if not isinstance(entry, dict):
-            continue
 
-        info = entry.get("info", {})
-        severity = info.get("severity", "info").upper()
-        location = entry.get("matched-at") or entry.get("host") or info.get("reference", [None])[0]
-        findings.append({
-            "source": "Nuclei",
-            "name": info.get("name", "Unknown"),
-            "severity": severity,
-            "description": info.get("description", ""),
-            "solution": info.get("remediation", "Review and patch"),
-            "matched_at": entry.get("matched-at", ""),
-            "location": location or "Unknown",
-            "template_id": info.get("id") or entry.get("template-id"),
-            "scanner": "Nuclei"
-        })
+def parse_nuclei_report(report_path: Path):
+    if not report_path.exists():
+        return []
 
+    findings = []
+    with report_path.open("rb") as fh:
+        for entry in iter_nuclei_entries(fh):
+            if not isinstance(entry, dict):
+                continue
+
+            info = entry.get("info", {})
+            severity = normalize_severity(info.get("severity", "info"))
+            location = entry.get("matched-at") or entry.get("host") or info.get("reference", [None])[0]
+            findings.append(NucleiFinding(
+                source="Nuclei",
+                name=_intern(info.get("name", "Unknown")),
+                severity=severity,
+                description=_intern(info.get("description", "")),
+                solution=_intern(info.get("remediation", "Review and patch")),
+                matched_at=entry.get("matched-at", ""),
+                location=location or "Unknown",
+                template_id=info.get("id") or entry.get("template-id"),
+                scanner="Nuclei"
+            ))
+
+    return findings
+
+
+def parse_reports(zap_report: Path, nuclei_report: Path):
+    """Parse both reports, overlapping them in a worker process when they are large."""
+    sizes = {path: path.stat().st_size for path in (zap_report, nuclei_report) if path.exists()}
+    if len(sizes) < 2 or sum(sizes.values()) < PARALLEL_PARSE_BYTES:
+        findings = parse_zap_report(zap_report)
+        findings.extend(parse_nuclei_report(nuclei_report))
+        return findings
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Hand the smaller report to the worker so fewer findings cross the process boundary.
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        if sizes[zap_report] >= sizes[nuclei_report]:
+            nuclei_future = executor.submit(parse_nuclei_report, nuclei_report)
+            findings = parse_zap_report(zap_report)
+            findings.extend(nuclei_future.result())
+        else:
+            zap_future = executor.submit(parse_zap_report, zap_report)
+            nuclei_findings = parse_nuclei_report(nuclei_report)
+            findings = zap_future.result()
+            findings.extend(nuclei_findings)
     return findings
 
 
@@ -96,48 +210,56 @@ def main():
     parser.add_argument("--output", required=True, type=Path, help="JSON file that stores the final evaluation")
     parser.add_argument("--opa-version", default=os.getenv("OPA_VERSION", "latest"), help="OPA release tag to download or use (default: latest)")
     parser.add_argument("--policy-dir", default=str(Path(__file__).resolve().parent.parent / "policies"), help="Directory containing OPA policies")
+    parser.add_argument("--no-cache", action="store_true", help="Always run OPA instead of reusing a cached evaluation")
+    parser.add_argument("--opa-daemon", action="store_true", help="Evaluate through a shared `opa run --server` daemon tracked in reports/.opa-daemon")
+    parser.add_argument("--debug-dump", action="store_true", help="Also write the OPA input payload to dast-input.json next to the output")
 
     args = parser.parse_args()
     cache_dir = args.output.parent / ".opa-cache"
 
-    findings = parse_zap_report(args.zap_report)
-    findings.extend(parse_nuclei_report(args.nuclei_report))
+    # The slotted records only live through parsing; OPA and the output need plain dicts.
+    finding_dicts = [finding.to_dict() for finding in parse_reports(args.zap_report, args.nuclei_report)]
 
     input_payload = {
         "app_name": args.app_name,
-        "findings": findings
+        "findings": finding_dicts
     }
+    args.output.parent.mkdir(parents=True, exist_ok=True)
     input_path = args.output.parent / "dast-input.json"
-    input_path.parent.mkdir(parents=True, exist_ok=True)
-    with input_path.open("w") as fh:
-        json.dump(input_payload, fh, indent=2)
+    if args.debug_dump:
+        with input_path.open("w", encoding="utf-8") as fh:
+            fh.write(dumps(input_payload))
 
     policy_dir = Path(args.policy_dir)
     if not policy_dir.is_dir():
         raise SystemExit(f"Policy directory does not exist: {policy_dir}")
     print(f"Using policy directory: {policy_dir}")
     opa_binary = ensure_opa_binary(cache_dir, args.opa_version)
-    evaluation = run_opa(opa_binary, input_path, policy_dir)
+    evaluation_cache = None if args.no_cache else cache_dir / "evaluations"
+    daemon_dir = DAEMON_DIR if args.opa_daemon else None
+    evaluation = run_opa(opa_binary, input_payload, policy_dir, cache_dir=evaluation_cache, daemon_dir=daemon_dir)
 
     final_output = {
         "app_name": args.app_name,
         "status": evaluation.get("status", "FAIL"),
         "risk_score": evaluation.get("risk_score", 0),
         "severity_counts": evaluation.get("severity_counts", {}),
-        "total_findings": len(findings),
-        "findings": findings,
+        "total_findings": len(finding_dicts),
+        "findings": finding_dicts,
+        "precomputed": build_precomputed(finding_dicts),
         "violations": evaluation.get("violations", []),
         "recommendations": evaluation.get("recommendations", []),
         "policy_reference": str(policy_dir / "severity-rules.rego"),
-        "analysis_time": datetime.utcnow().isoformat() + "Z"
+        "analysis_time": datetime.now(UTC).isoformat(timespec="seconds").replace("+00:00", "Z")
     }
 
-    with args.output.open("w") as fh:
-        json.dump(final_output, fh, indent=2)
+    with args.output.open("w", encoding="utf-8") as fh:
+        fh.write(dumps(final_output))
 
     print(f"Evaluation complete: {final_output['status']}")
     print(f"Risk score: {final_output['risk_score']}")
-    print(f"Input payload: {input_path}")
+    if args.debug_dump:
+        print(f"Input payload: {input_path}")
     print(f"Policy reference: {final_output['policy_reference']}")
 
 
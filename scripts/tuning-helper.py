@@ -2,47 +2,33 @@
 """Create tuning guidance from the latest DAST evaluation."""
 
 import argparse
-import json
+import time
 from collections import Counter
-from datetime import datetime
 
-
-def flatten_findings(findings):
-    flattened = []
-    for finding in findings:
-        source = finding.get("scanner") or finding.get("source", "Unknown")
-        rule = finding.get("rule_id") or finding.get("template_id") or finding.get("name")
-        key = f"{source}:{rule}"
-        flattened.append({
-            "key": key,
-            "source": source,
-            "name": finding.get("name", "Unknown"),
-            "rule": rule,
-            "severity": finding.get("severity", "INFO"),
-            "location": finding.get("location") or finding.get("matched_at") or "Unknown",
-            "description": finding.get("description", ""),
-        })
-    return flattened
+from json_utils import dumps, loads
 
 
 def summarize_findings(findings, limit):
     counter = Counter()
     details = {}
     for finding in findings:
-        counter[finding["key"]] += 1
-        details.setdefault(finding["key"], finding)
+        source = finding.get("scanner") or finding.get("source", "Unknown")
+        rule = finding.get("rule_id") or finding.get("template_id") or finding.get("name")
+        key = (source, rule)
+        counter[key] += 1
+        details.setdefault(key, finding)
 
     summary = []
-    for key, count in counter.most_common(limit):
-        record = details[key]
+    for (source, rule), count in counter.most_common(limit):
+        record = details[(source, rule)]
         summary.append({
-            "source": record["source"],
-            "rule": record["rule"],
-            "name": record["name"],
+            "source": source,
+            "rule": rule,
+            "name": record.get("name", "Unknown"),
             "count": count,
-            "severity": record["severity"],
-            "location": record["location"],
-            "description": record["description"],
+            "severity": record.get("severity", "INFO"),
+            "location": record.get("location") or record.get("matched_at") or "Unknown",
+            "description": record.get("description", ""),
         })
     return summary
 
@@ -96,13 +82,12 @@ def main():
     parser.add_argument("--limit", type=int, default=3, help="Top findings to highlight")
     args = parser.parse_args()
 
-    with open(args.input) as fh:
-        evaluation = json.load(fh)
+    with open(args.input, "rb") as fh:
+        evaluation = loads(fh.read())
 
-    findings = flatten_findings(evaluation.get("findings", []))
-    top_findings = summarize_findings(findings, args.limit)
+    top_findings = summarize_findings(evaluation.get("findings", []), args.limit)
     suggestions = build_suggestions(top_findings)
-    timestamp = datetime.utcnow().strftime("%Y-%m-%d %H:%M UTC")
+    timestamp = time.strftime("%Y-%m-%d %H:%M UTC", time.gmtime())
     markdown = format_markdown(suggestions, evaluation, timestamp)
 
     summary_data = {
@@ -115,8 +100,8 @@ def main():
     with open(args.output, "w") as fh:
         fh.write(markdown)
 
-    with open(args.json, "w") as fh:
-        json.dump(summary_data, fh, indent=2)
+    with open(args.json, "w", encoding="utf-8") as fh:
+        fh.write(dumps(summary_data))
 
     print(f"Tuning guidance written to {args.output} and {args.json}")
 